@@ -1,6 +1,32 @@
 import pandas as pd
 import numpy as np
-
+try:
+    from .imputation import GroupedImputer
+    from .profiling import profile_stage
+except ImportError:  # run directly as `python data_merge.py`
+    from imputation import GroupedImputer
+    from profiling import profile_stage
+
+CUSTOMER_NUMERIC_COLS = [
+    'num_orders', 'total_order_amount', 'total_discounts', 'total_items', 'unique_products',
+    'total_quantity', 'total_item_price', 'total_returns', 'num_interactions', 'num_campaigns',
+    'total_spend', 'total_impressions', 'total_clicks'
+]
+
+def pre_cutoff_tables(orders, order_items, returns, label_days=30):
+    """
+    Restrict orders, and the items/returns that belong to them, to orders placed on or
+    before max(order_date) - label_days, the feature window train_churn.make_label uses.
+    Summaries built from these tables are what imputers should be fitted on so the churn
+    label window does not leak into the fill values.
+    """
+    order_dates = pd.to_datetime(orders['order_date'])
+    cutoff_date = order_dates.max() - pd.Timedelta(days=label_days)
+    kept = orders[order_dates <= cutoff_date]
+    kept_ids = kept['order_id']
+    return kept, order_items[order_items['order_id'].isin(kept_ids)], returns[returns['order_id'].isin(kept_ids)]
+
+@profile_stage()
 def load_data():
     customers = pd.read_csv("data/customers_dim.csv")
     orders = pd.read_csv("data/orders_fact.csv")
@@ -11,7 +37,14 @@ def load_data():
     returns = pd.read_csv("data/returns_refunds.csv")
     return customers, orders, order_items, products, interactions, marketing, returns
 
-def summarize_per_order(customers, orders, order_items, products, interactions, marketing, returns):
+@profile_stage()
+def summarize_per_order(customers, orders, order_items, products, interactions, marketing, returns,
+                        imputer=None, group_cols=None, return_imputer=False):
+    """
+    Build the order-level summary. Missing values are filled by a GroupedImputer:
+    pass a fitted `imputer` to reuse stored statistics, otherwise one is fitted here
+    (optionally per `group_cols`). With return_imputer=True returns (order_summary, imputer).
+    """
 
     # ---- Orders + Customers ----
     order_df = pd.merge(orders, customers, on="customer_id", how="left")
@@ -20,11 +53,11 @@ def summarize_per_order(customers, orders, order_items, products, interactions,
     items_df = pd.merge(order_items, products, on="product_id", how="left")
     items_summary = items_df.groupby("order_id").agg({
         "order_item_id": "count",                          # num order items
-        "product_id": lambda x: ','.join(map(str, set(x))),# distinct product_ids
+        "product_id": lambda x: ','.join(sorted(map(str, set(x)))),# distinct product_ids
         "quantity": "sum",                                 # total quantity
         "price_x": "sum",                                  # sum of item prices
-        "category": lambda x: ','.join(set(x.dropna())),
-        "subcategory": lambda x: ','.join(set(x.dropna()))
+        "category": lambda x: ','.join(sorted(set(x.dropna()))),
+        "subcategory": lambda x: ','.join(sorted(set(x.dropna())))
     }).reset_index().rename(columns={
         "order_item_id": "num_items",
         "product_id": "products_in_order",
@@ -37,8 +70,8 @@ def summarize_per_order(customers, orders, order_items, products, interactions,
     # ---- Returns per order ----
     returns_summary = returns.groupby("order_id").agg({
         "return_id": "count",
-        "return_date": lambda x: ','.join(set(x.dropna().astype(str))),
-        "reason": lambda x: ','.join(set(x.dropna()))
+        "return_date": lambda x: ','.join(sorted(set(x.dropna().astype(str)))),
+        "reason": lambda x: ','.join(sorted(set(x.dropna())))
     }).reset_index().rename(columns={
         "return_id": "num_returns",
         "reason": "return_reasons"
@@ -47,8 +80,8 @@ def summarize_per_order(customers, orders, order_items, products, interactions,
     # ---- Interactions per customer ----
     inter_summary = interactions.groupby("customer_id").agg({
         "interaction_id": "count",
-        "type": lambda x: ','.join(set(x.dropna())),
-        "text": lambda x: ' | '.join(set(x.dropna()))
+        "type": lambda x: ','.join(sorted(set(x.dropna()))),
+        "text": lambda x: ' | '.join(sorted(set(x.dropna())))
     }).reset_index().rename(columns={
         "interaction_id": "num_interactions",
         "type": "interaction_types",
@@ -78,23 +111,34 @@ def summarize_per_order(customers, orders, order_items, products, interactions,
     )
 
 
-    # Numeric columns: fill with median (or mean if you prefer)
-    for col in ['num_returns', 'num_interactions', 'num_campaigns', 
-                'total_spend', 'total_impressions', 'total_clicks']:
-        order_summary[col] = order_summary[col].fillna(order_summary[col].median())
-
-    # Date columns: fill with most frequent date (mode)
-    order_summary['return_date'] = order_summary['return_date'].fillna(order_summary['return_date'].mode()[0])
-
-    # Categorical/text columns: fill with mode (most common value)
-    for col in ['return_reasons', 'interaction_types', 'interaction_texts', 'channel']:
-        order_summary[col] = order_summary[col].fillna(order_summary[col].mode()[0])
+    # ---- Fill nulls ----
+    # Numeric columns with median; date and categorical/text columns with mode
+    if imputer is None:
+        imputer = GroupedImputer(
+            numeric_cols=['num_returns', 'num_interactions', 'num_campaigns',
+                          'total_spend', 'total_impressions', 'total_clicks'],
+            mode_cols=['return_date', 'return_reasons', 'interaction_types', 'interaction_texts', 'channel'],
+            group_cols=group_cols,
+        ).fit(order_summary)
+    order_summary = imputer.transform(order_summary)
 
     print(order_summary.isnull().sum())
+    if return_imputer:
+        return order_summary, imputer
     return order_summary
 
 
-def summarize_per_customer(customers, orders, order_items, interactions, marketing, returns):
+@profile_stage()
+def summarize_per_customer(customers, orders, order_items, interactions, marketing, returns,
+                           imputer=None, group_cols=None, return_imputer=False):
+    """
+    Build the customer-level summary. Missing values are filled by a GroupedImputer:
+    pass a fitted `imputer` to reuse stored statistics, otherwise one is fitted here
+    (optionally per `group_cols`, e.g. ['cohort']) on the full summary. To keep a
+    churn label window out of the statistics, fit the imputer on a summary built from
+    pre-cutoff orders and pass it in. With return_imputer=True returns
+    (customer_summary, imputer).
+    """
     # ---- Orders aggregated per customer ----
     orders_summary = orders.groupby("customer_id").agg({
         "order_id": "count",
@@ -110,7 +154,7 @@ def summarize_per_customer(customers, orders, order_items, interactions, marketi
     order_items_link = pd.merge(order_items, orders[["order_id","customer_id"]], on="order_id", how="left")
     items_summary = order_items_link.groupby("customer_id").agg({
         "order_item_id": "count",
-        "product_id": lambda x: ','.join(map(str, set(x))),
+        "product_id": lambda x: ','.join(sorted(map(str, set(x)))),
         "quantity": "sum",
         "price": "sum"
     }).reset_index().rename(columns={
@@ -124,7 +168,7 @@ def summarize_per_customer(customers, orders, order_items, interactions, marketi
     returns_link = pd.merge(returns, orders[["order_id","customer_id"]], on="order_id", how="left")
     returns_summary = returns_link.groupby("customer_id").agg({
         "return_id": "count",
-        "reason": lambda x: ','.join(set(x.dropna()))
+        "reason": lambda x: ','.join(sorted(set(x.dropna())))
     }).reset_index().rename(columns={
         "return_id": "total_returns",
         "reason": "return_reasons"
@@ -133,8 +177,8 @@ def summarize_per_customer(customers, orders, order_items, interactions, marketi
     # ---- Interactions per customer ----
     inter_summary = interactions.groupby("customer_id").agg({
         "interaction_id": "count",
-        "type": lambda x: ','.join(set(x.dropna())),
-        "text": lambda x: ' | '.join(set(x.dropna()))
+        "type": lambda x: ','.join(sorted(set(x.dropna()))),
+        "text": lambda x: ' | '.join(sorted(set(x.dropna())))
     }).reset_index().rename(columns={
         "interaction_id": "num_interactions",
         "type": "interaction_types",
@@ -173,27 +217,28 @@ def summarize_per_customer(customers, orders, order_items, interactions, marketi
     customer_summary['unique_products'] = pd.to_numeric(customer_summary['unique_products'], errors='coerce')
 
     # ---- Fill nulls ----
-    # Fill numeric columns with median
-    numeric_cols = [
-        'num_orders', 'total_order_amount', 'total_discounts', 'total_items', 'unique_products',
-        'total_quantity', 'total_item_price', 'total_returns', 'num_interactions', 'num_campaigns',
-        'total_spend', 'total_impressions', 'total_clicks'
-    ]
-    for col in numeric_cols:
-        customer_summary[col] = customer_summary[col].fillna(customer_summary[col].median())
-
-    # Fill categorical/text columns with mode (most frequent value)
-    mode_cols = ['return_reasons', 'interaction_types', 'interaction_texts', 'channel']
-    for col in mode_cols:
-        customer_summary[col] = customer_summary[col].fillna(customer_summary[col].mode()[0])
-        
+    # Numeric columns with median; categorical/text columns with mode
+    if imputer is None:
+        imputer = GroupedImputer(
+            numeric_cols=CUSTOMER_NUMERIC_COLS,
+            mode_cols=['return_reasons', 'interaction_types', 'interaction_texts', 'channel'],
+            group_cols=group_cols,
+        ).fit(customer_summary)
+    customer_summary = imputer.transform(customer_summary)
+
     print(customer_summary.isnull().sum())
+    if return_imputer:
+        return customer_summary, imputer
     return customer_summary
 
 if __name__ == "__main__":
     customers, orders, order_items, products, interactions, marketing, returns = load_data()
-    order_summary = summarize_per_order(customers, orders, order_items, products, interactions, marketing, returns)
-    customer_summary = summarize_per_customer(customers, orders, order_items, interactions, marketing, returns)
+    order_summary, order_imputer = summarize_per_order(
+        customers, orders, order_items, products, interactions, marketing, returns, return_imputer=True)
+    customer_summary, customer_imputer = summarize_per_customer(
+        customers, orders, order_items, interactions, marketing, returns, return_imputer=True)
 
     order_summary.to_csv("data/order_summary.csv", index=False)
     customer_summary.to_csv("data/customer_summary.csv", index=False)
+    order_imputer.save("data/order_imputer.pkl")
+    customer_imputer.save("data/customer_imputer.pkl")
@@ -0,0 +1,142 @@
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class GroupedImputer:
+    """
+    Fit-once imputer for the customer/order summaries.
+
+    - numeric_cols are filled with the median, mode_cols with the most frequent value.
+    - With group_cols (e.g. ['cohort'] or ['acquisition_channel']) statistics are computed
+      per group and rows fall back to the global statistic when their group is unseen
+      or has no observed values.
+    - Medians come from a uniform row sample of at most `sketch_size` rows (exact when the
+      data is smaller), computed for all numeric columns in one groupby pass.
+    - Modes are counted on 64-bit hashes of the values rather than the values themselves,
+      so long interaction texts are hashed once and counted as integers. Ties go to the
+      smallest value, as with Series.mode()[0].
+
+    transform only ever applies the stored statistics, so whatever data the imputer is
+    fitted on is the only data that influences the fill values. Persist with save() and
+    scoring-time data is imputed identically without touching the fitting data again.
+    """
+
+    def __init__(self, numeric_cols=(), mode_cols=(), group_cols=None, sketch_size=200_000, random_state=42):
+        self.numeric_cols = list(numeric_cols)
+        self.mode_cols = list(mode_cols)
+        self.group_cols = list(group_cols) if group_cols else []
+        self.sketch_size = sketch_size
+        self.random_state = random_state
+
+    # ---- fitting ----
+    def _present(self, df, cols):
+        return [c for c in cols if c in df.columns]
+
+    def _group_keys(self, df):
+        return [c for c in self.group_cols if c in df.columns]
+
+    def fit(self, df):
+        num_cols = self._present(df, self.numeric_cols)
+        mode_cols = self._present(df, self.mode_cols)
+        keys = self._group_keys(df)
+
+        # ---- numeric: sampled median sketch ----
+        sample = df
+        if self.sketch_size and len(df) > self.sketch_size:
+            sample = df.sample(n=self.sketch_size, random_state=self.random_state)
+        num = sample[num_cols].apply(pd.to_numeric, errors='coerce')
+        self.global_medians_ = num.median().to_dict()
+        self.group_medians_ = None
+        if keys and num_cols:
+            num[keys] = sample[keys]
+            self.group_medians_ = num.groupby(keys, dropna=True)[num_cols].median().reset_index()
+
+        # ---- categorical/text: hashed value counts ----
+        self.global_modes_ = {}
+        group_modes = []
+        for col in mode_cols:
+            values = df[col].dropna()
+            if values.empty:
+                self.global_modes_[col] = np.nan
+                continue
+            hashes = pd.util.hash_pandas_object(values, index=False)
+            # map each hash back to one representative value
+            first_value = pd.Series(values.values, index=hashes.values)
+            first_value = first_value[~first_value.index.duplicated()]
+
+            counts = hashes.value_counts()
+            tied = first_value[counts.index[counts == counts.max()]]
+            self.global_modes_[col] = tied.sort_values().iloc[0]
+
+            if keys:
+                counts = (
+                    df.loc[values.index, keys]
+                    .assign(_h=hashes.values)
+                    .groupby(keys + ['_h'], dropna=True)
+                    .size()
+                    .reset_index(name='_n')
+                )
+                counts[col] = first_value.reindex(counts['_h'].values).values
+                counts = (
+                    counts.sort_values(['_n', col], ascending=[False, True], kind='stable')
+                    .drop_duplicates(keys)
+                )
+                group_modes.append(counts[keys + [col]].set_index(keys))
+
+        self.group_modes_ = pd.concat(group_modes, axis=1).reset_index() if group_modes else None
+        self.fitted_columns_ = {'numeric': num_cols, 'mode': mode_cols, 'group': keys}
+        return self
+
+    # ---- applying ----
+    def _group_fill(self, df, table, cols):
+        """Row-aligned frame of per-group statistics for df (NaN where the group is unseen)."""
+        keys = self.fitted_columns_['group']
+        if table is None or not keys or not all(k in df.columns for k in keys):
+            return None
+        # columns with no observed values at fit time have no per-group statistic
+        cols = [c for c in cols if c in table.columns]
+        if not cols:
+            return None
+        aligned = df[keys].merge(table[keys + cols], on=keys, how='left')
+        aligned.index = df.index
+        return aligned[cols]
+
+    def transform(self, df):
+        if not hasattr(self, 'fitted_columns_'):
+            raise RuntimeError("GroupedImputer must be fitted before transform")
+        df = df.copy()
+        num_cols = self._present(df, self.fitted_columns_['numeric'])
+        mode_cols = self._present(df, self.fitted_columns_['mode'])
+
+        if num_cols:
+            df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce')
+            fill = self._group_fill(df, self.group_medians_, num_cols)
+            if fill is not None:
+                df[num_cols] = df[num_cols].fillna(fill)
+            df[num_cols] = df[num_cols].fillna(self.global_medians_)
+
+        if mode_cols:
+            fill = self._group_fill(df, self.group_modes_, mode_cols)
+            if fill is not None:
+                df[mode_cols] = df[mode_cols].fillna(fill)
+            df[mode_cols] = df[mode_cols].fillna({c: self.global_modes_[c] for c in mode_cols})
+        return df
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    # ---- persistence ----
+    def save(self, path):
+        path = Path(path)
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,321 @@
+# DAG runner for the merge -> preprocess -> (churn, CLV) pipeline.
+# Each stage is fingerprinted from its input file hashes, parameters and source code;
+# stages whose fingerprint matches the last successful run (and whose outputs are intact)
+# are skipped. Independent stages run in parallel worker processes.
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+import pandas as pd
+
+from .config import PROCESSED_DIR, MODELS_DIR
+from . import data_merge, data_loader, imputation, preprocess
+from .models import train_churn as train_churn_mod, train_clv as train_clv_mod
+from .profiling import stage as profile_block
+
+CACHE_DIR = Path(".pipeline_cache")
+DATA_DIR = Path("data")
+
+Stage = namedtuple("Stage", ["name", "func", "inputs", "outputs", "params", "code", "deps"])
+
+
+# ---- Stage functions (top-level so they can be sent to worker processes) ----
+
+def run_merge(inputs, outputs, params):
+    customers, orders, order_items, products, interactions, marketing, returns = data_merge.load_data()
+    group_cols = params["impute_group_cols"]
+
+    # fit the imputers on pre-cutoff data only so the churn label window cannot leak
+    # into the fill values, then apply them to the full summaries
+    fit_orders, fit_items, fit_returns = data_merge.pre_cutoff_tables(
+        orders, order_items, returns, label_days=params["label_days"])
+    _, order_imputer = data_merge.summarize_per_order(
+        customers, fit_orders, fit_items, products, interactions, marketing, fit_returns,
+        group_cols=group_cols, return_imputer=True)
+    _, customer_imputer = data_merge.summarize_per_customer(
+        customers, fit_orders, fit_items, interactions, marketing, fit_returns,
+        group_cols=group_cols, return_imputer=True)
+
+    order_summary = data_merge.summarize_per_order(
+        customers, orders, order_items, products, interactions, marketing, returns, imputer=order_imputer)
+    customer_summary = data_merge.summarize_per_customer(
+        customers, orders, order_items, interactions, marketing, returns, imputer=customer_imputer)
+    order_summary.to_csv(outputs["order_summary"], index=False)
+    customer_summary.to_csv(outputs["customer_summary"], index=False)
+    order_imputer.save(outputs["order_imputer"])
+    customer_imputer.save(outputs["customer_imputer"])
+
+
+def run_preprocess(inputs, outputs, params):
+    customers = data_loader.load_customers(inputs["customer_summary"])
+    orders = data_loader.load_orders(inputs["order_summary"])
+    imputer = imputation.GroupedImputer.load(inputs["customer_imputer"])
+    order_imputer = imputation.GroupedImputer.load(inputs["order_imputer"])
+    preprocess.process_and_save(customers, orders, imputer=imputer, order_imputer=order_imputer)
+
+
+def run_train_churn(inputs, outputs, params):
+    customers = pd.read_parquet(inputs["customers_clean"])
+    orders = pd.read_parquet(inputs["orders_clean"])
+    model, encodings = train_churn_mod.train_churn(
+        customers, orders, label_days=params["label_days"], return_encodings=True)
+    _save_pickle(model, outputs["churn_model"])
+    _save_pickle(encodings, outputs["churn_encodings"])
+
+
+def run_train_clv(inputs, outputs, params):
+    orders = pd.read_parquet(inputs["orders_clean"])
+    bgf, ggf = train_clv_mod.train_bgfgg(
+        orders,
+        penalizer_coef=params["penalizer_coef"],
+        gg_penalizer_coef=params["gg_penalizer_coef"],
+    )
+    _save_fitter(bgf, outputs["bgf"])
+    _save_fitter(ggf, outputs["ggf"])
+
+
+def _save_pickle(obj, path):
+    os.makedirs(Path(path).parent, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+
+
+def _save_fitter(fitter, path):
+    """
+    Save a lifetimes fitter so predict.load_bgf_ggf can pickle.load it. A fitted
+    BetaGeoFitter holds a generate_new_data lambda that plain pickle cannot serialise,
+    so it is dropped via save_model. ggf may be None when Gamma-Gamma did not converge.
+    """
+    if fitter is None:
+        _save_pickle(None, path)
+        return
+    os.makedirs(Path(path).parent, exist_ok=True)
+    fitter.save_model(str(path), save_data=False, save_generate_data_method=False)
+
+
+def build_stages(label_days=30, penalizer_coef=1.0, gg_penalizer_coef=0.01, impute_group_cols=None):
+    """
+    Declare the pipeline DAG. Returns an ordered dict-like mapping name -> Stage.
+    """
+    raw = {
+        name: DATA_DIR / f"{name}.csv"
+        for name in ["customers_dim", "orders_fact", "order_items", "products_dim",
+                     "customer_interactions", "marketing_spend", "returns_refunds"]
+    }
+    summaries = {
+        "customer_summary": DATA_DIR / "customer_summary.csv",
+        "order_summary": DATA_DIR / "order_summary.csv",
+        "customer_imputer": DATA_DIR / "customer_imputer.pkl",
+        "order_imputer": DATA_DIR / "order_imputer.pkl",
+    }
+    clean = {
+        "customers_clean": PROCESSED_DIR / "customers_clean.parquet",
+        "orders_clean": PROCESSED_DIR / "orders_clean.parquet",
+    }
+
+    # the stage functions live here, so every stage also depends on this module
+    this = sys.modules[__name__]
+    stages = [
+        Stage("merge", run_merge, raw, summaries,
+              {"impute_group_cols": list(impute_group_cols) if impute_group_cols else None,
+               # imputers are fitted before the churn cutoff, so they depend on label_days
+               "label_days": label_days},
+              [data_merge, imputation, this], []),
+        Stage("preprocess", run_preprocess, summaries, clean, {},
+              [preprocess, data_loader, imputation, this], ["merge"]),
+        Stage("train_churn", run_train_churn, clean,
+              {"churn_model": Path(MODELS_DIR) / "churn_model.pkl",
+               "churn_encodings": Path(MODELS_DIR) / "churn_encodings.pkl"},
+              {"label_days": label_days}, [train_churn_mod, this], ["preprocess"]),
+        Stage("train_clv", run_train_clv, {"orders_clean": clean["orders_clean"]},
+              {"bgf": Path(MODELS_DIR) / "bgf.pkl", "ggf": Path(MODELS_DIR) / "ggf.pkl"},
+              {"penalizer_coef": penalizer_coef, "gg_penalizer_coef": gg_penalizer_coef},
+              [train_clv_mod, this], ["preprocess"]),
+    ]
+    return {s.name: s for s in stages}
+
+
+# ---- Fingerprinting ----
+
+def _load_hash_index():
+    p = CACHE_DIR / "file_hashes.json"
+    if p.exists():
+        with open(p) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_hash_index(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(CACHE_DIR / "file_hashes.json", "w") as f:
+        json.dump(index, f, indent=2)
+
+
+def file_hash(path, index):
+    """
+    sha256 of a file. Hashes are memoised in `index` keyed by path, size and mtime
+    so unchanged large inputs are not re-read on every run.
+    """
+    path = Path(path)
+    st = path.stat()
+    key = str(path.resolve())
+    entry = index.get(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    index[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+    return digest
+
+
+def code_hash(modules):
+    h = hashlib.sha256()
+    for mod in modules:
+        # file name rather than __name__, which is '__main__' under `python -m`
+        path = Path(mod.__file__)
+        h.update(path.name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def fingerprint(stage, index):
+    payload = {
+        "stage": stage.name,
+        "params": stage.params,
+        "code": code_hash(stage.code),
+        "inputs": {k: file_hash(p, index) for k, p in sorted(stage.inputs.items())},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _manifest_path(stage):
+    return CACHE_DIR / f"{stage.name}.json"
+
+
+def is_cached(stage, fp, index):
+    p = _manifest_path(stage)
+    if not p.exists():
+        return False
+    with open(p) as f:
+        manifest = json.load(f)
+    if manifest.get("fingerprint") != fp:
+        return False
+    for k, out in stage.outputs.items():
+        if not Path(out).exists() or file_hash(out, index) != manifest["outputs"].get(k):
+            return False
+    return True
+
+
+def write_manifest(stage, fp, index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest = {
+        "fingerprint": fp,
+        "params": stage.params,
+        "outputs": {k: file_hash(p, index) for k, p in stage.outputs.items()},
+    }
+    with open(_manifest_path(stage), "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+
+def _execute(name, func, inputs, outputs, params):
+    # Stage.code holds module objects, which cannot be pickled, so only the
+    # callable and its arguments are shipped to the worker.
+    with profile_block(f"pipeline.{name}"):
+        func(inputs, outputs, params)
+    return name
+
+
+# ---- Runner ----
+
+def run_pipeline(stages, force=(), max_workers=None):
+    """
+    Run the DAG, skipping stages whose fingerprint matches a previous successful run.
+    `force` is a collection of stage names to re-run regardless of cache.
+    Returns a dict name -> 'cached' | 'ran' | 'failed' | 'skipped'.
+    """
+    index = _load_hash_index()
+    status = {}
+    fingerprints = {}
+    running = {}
+
+    def ready():
+        return [
+            s for name, s in stages.items()
+            if name not in status and name not in running.values()
+            and all(status.get(d) in ("cached", "ran") for d in s.deps)
+        ]
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            while True:
+                # cache hits can unblock further stages, so keep scheduling until nothing new is ready
+                batch = ready()
+                while batch:
+                    for s in batch:
+                        try:
+                            fp = fingerprint(s, index)
+                            cached = s.name not in force and is_cached(s, fp, index)
+                        except (OSError, ValueError) as e:
+                            # missing/unreadable input or corrupt manifest: fail this stage only
+                            print(f"[pipeline] {s.name}: failed ({e})")
+                            status[s.name] = "failed"
+                            continue
+                        fingerprints[s.name] = fp
+                        if cached:
+                            print(f"[pipeline] {s.name}: cached")
+                            status[s.name] = "cached"
+                            continue
+                        print(f"[pipeline] {s.name}: running")
+                        fut = pool.submit(_execute, s.name, s.func, s.inputs, s.outputs, s.params)
+                        running[fut] = s.name
+                    batch = ready()
+
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        fut.result()
+                        # raises if the stage did not write one of its declared outputs
+                        write_manifest(stages[name], fingerprints[name], index)
+                    except Exception as e:
+                        print(f"[pipeline] {name}: failed ({e})")
+                        status[name] = "failed"
+                        continue
+                    status[name] = "ran"
+                    print(f"[pipeline] {name}: done")
+    finally:
+        _save_hash_index(index)
+
+    # anything left never became ready because an upstream stage failed
+    for name in stages:
+        status.setdefault(name, "skipped")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the churn/CLV pipeline with cached stages.")
+    parser.add_argument("--label-days", type=int, default=30)
+    parser.add_argument("--penalizer-coef", type=float, default=1.0)
+    parser.add_argument("--gg-penalizer-coef", type=float, default=0.01)
+    parser.add_argument("--impute-by", nargs="*", default=None, help="group columns for imputation, e.g. cohort")
+    parser.add_argument("--force", nargs="*", default=[], help="stage names to re-run regardless of cache")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    stages = build_stages(args.label_days, args.penalizer_coef, args.gg_penalizer_coef, args.impute_by)
+    result = run_pipeline(stages, force=set(args.force), max_workers=args.workers)
+    print(json.dumps(result, indent=2))
+    if any(v in ("failed", "skipped") for v in result.values()):
+        sys.exit(1)
@@ -2,6 +2,7 @@ from pathlib import Path
 import pickle
 import xgboost as xgb
 from ..config import MODELS_DIR
+from ..profiling import profile_stage
 
 def load_churn_model(path=None):
     p = Path(path) if path else Path(MODELS_DIR) / "churn_model.pkl"
@@ -9,6 +10,7 @@ def load_churn_model(path=None):
         model = pickle.load(f)
     return model
 
+@profile_stage()
 def predict_churn_for_customer(model, X_customer):
     """
     X_customer: pandas DataFrame (1 row) containing features used at train time.
@@ -26,3 +28,12 @@ def load_bgf_ggf(bgf_path=None, ggf_path=None):
     with open(ggf_p, "rb") as f:
         ggf = pickle.load(f)
     return bgf, ggf
+
+def load_churn_encodings(path=None):
+    """
+    Category lists and object-column codes saved next to the churn model at training time
+    (see train_churn.fit_categories / fit_codes).
+    """
+    p = Path(path) if path else Path(MODELS_DIR) / "churn_encodings.pkl"
+    with open(p, "rb") as f:
+        return pickle.load(f)
@@ -1,15 +1,22 @@
 import pandas as pd
 import numpy as np
 from .config import PROCESSED_DIR
+from .data_merge import CUSTOMER_NUMERIC_COLS
+from .profiling import profile_stage
 import os
 
-def clean_customers(df):
+def clean_customers(df, imputer=None):
+    """
+    imputer: optional fitted GroupedImputer (from summarize_per_customer). Columns it covers
+    are imputed from its stored statistics first; anything still missing (e.g. a column
+    that was all-NaN or absent at fit time) is filled with 0.
+    """
     df = df.copy()
+    if imputer is not None:
+        df = imputer.transform(df)
+
     # fill missing numeric fields with 0
-    numeric_cols = ['num_orders','total_order_amount','total_discounts','total_items','unique_products',
-                    'total_quantity','total_item_price','total_returns','num_interactions','num_campaigns',
-                    'total_spend','total_impressions','total_clicks']
-    for c in numeric_cols:
+    for c in CUSTOMER_NUMERIC_COLS:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
 
@@ -18,8 +25,15 @@ def clean_customers(df):
     df['loyalty_status'] = df.get('loyalty_status', pd.Series()).fillna('None').astype(str)
     return df
 
-def clean_orders(df):
+def clean_orders(df, imputer=None):
+    """
+    imputer: optional fitted GroupedImputer (from summarize_per_order), applied before the
+    0 / 'Unknown' fallbacks below.
+    """
     df = df.copy()
+    if imputer is not None:
+        df = imputer.transform(df)
+
     # numeric conversions
     numcols = ['order_amount','discount_amount','num_items','total_quantity','total_item_price','num_returns']
     for c in numcols:
@@ -37,9 +51,10 @@ def save_parquet(df, path):
     os.makedirs(path.parent, exist_ok=True)
     df.to_parquet(path, index=False)
 
-def process_and_save(customers_df, orders_df):
-    cust_clean = clean_customers(customers_df)
-    ord_clean = clean_orders(orders_df)
+@profile_stage()
+def process_and_save(customers_df, orders_df, imputer=None, order_imputer=None):
+    cust_clean = clean_customers(customers_df, imputer=imputer)
+    ord_clean = clean_orders(orders_df, imputer=order_imputer)
     save_parquet(cust_clean, PROCESSED_DIR / "customers_clean.parquet")
     save_parquet(ord_clean, PROCESSED_DIR / "orders_clean.parquet")
     return cust_clean, ord_clean
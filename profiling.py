@@ -0,0 +1,252 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Profiling is off unless switched on here or via the environment, so the
+# decorated stages cost a single dict lookup in normal runs.
+SETTINGS = {
+    "enabled": os.environ.get("CHURN_PROFILE", "0") == "1",
+    "log_path": os.environ.get("CHURN_PROFILE_LOG", "logs/profile.jsonl"),
+    "cprofile": os.environ.get("CHURN_PROFILE_CPROFILE", "0") == "1",
+    "tracemalloc": os.environ.get("CHURN_PROFILE_TRACEMALLOC", "0") == "1",
+    "top_n": 20,
+}
+
+# Stages nest (pipeline stage -> decorated function -> decorated helper). Only the
+# outermost active stage owns cProfile/tracemalloc: a second active profiler raises on
+# Python 3.12+ and an inner disable()/reset_peak() would cut the outer capture short.
+_DEPTH = 0
+
+# Per-stage peak RSS: each stage resets the kernel high-water mark on entry and reads it
+# on exit. Before a nested stage resets it, the enclosing stage's peak so far is carried
+# on this stack, and the nested peak is folded back in when it exits.
+_PEAK_STACK = []
+# Resetting VmHWM also resets ru_maxrss, so the lifetime peak is tracked across resets.
+_LIFETIME_PEAK = [0.0]
+
+
+def configure(enabled=None, log_path=None, cprofile=None, tracemalloc=None, top_n=None):
+    """
+    Update profiling settings at runtime. Arguments left as None keep their current value.
+    """
+    updates = {
+        "enabled": enabled,
+        "log_path": log_path,
+        "cprofile": cprofile,
+        "tracemalloc": tracemalloc,
+        "top_n": top_n,
+    }
+    for key, value in updates.items():
+        if value is not None:
+            SETTINGS[key] = value
+    return dict(SETTINGS)
+
+
+def _process_peak_rss_mb():
+    """Lifetime high-water mark of the process, not a per-stage value."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        peak = peak / (1024 * 1024)
+    else:
+        peak = peak / 1024
+    return max(peak, _LIFETIME_PEAK[0])
+
+
+def _current_rss_mb():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _read_hwm_mb():
+    """VmHWM (peak RSS since the last reset) from /proc, or None where unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_hwm():
+    """Reset VmHWM to the current RSS (Linux 4.0+). Returns False if not permitted."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _enter_peak():
+    hwm = _read_hwm_mb()
+    if hwm is not None:
+        _LIFETIME_PEAK[0] = max(_LIFETIME_PEAK[0], hwm)
+        if _PEAK_STACK and _PEAK_STACK[-1] is not None:
+            _PEAK_STACK[-1] = max(_PEAK_STACK[-1], hwm)
+    _PEAK_STACK.append(0.0 if _reset_hwm() else None)
+
+
+def _exit_peak():
+    carried = _PEAK_STACK.pop()
+    hwm = _read_hwm_mb()
+    if carried is None or hwm is None:
+        return None
+    peak = max(carried, hwm)
+    _LIFETIME_PEAK[0] = max(_LIFETIME_PEAK[0], peak)
+    if _PEAK_STACK and _PEAK_STACK[-1] is not None:
+        _PEAK_STACK[-1] = max(_PEAK_STACK[-1], peak)
+    return peak
+
+
+def _frames(obj):
+    """Collect DataFrames from a value, a tuple/list of values or a dict of values."""
+    if isinstance(obj, pd.DataFrame):
+        return [obj]
+    if isinstance(obj, (tuple, list)):
+        return [x for x in obj if isinstance(x, pd.DataFrame)]
+    if isinstance(obj, dict):
+        return [x for x in obj.values() if isinstance(x, pd.DataFrame)]
+    return []
+
+
+def frame_stats(obj):
+    """
+    Returns (rows, memory_mb) summed over all DataFrames found in obj, or (None, None).
+    """
+    frames = _frames(obj)
+    if not frames:
+        return None, None
+    rows = int(sum(len(df) for df in frames))
+    mem = float(sum(df.memory_usage(deep=True).sum() for df in frames)) / (1024 * 1024)
+    return rows, round(mem, 3)
+
+
+def write_record(record, path=None):
+    p = Path(path or SETTINGS["log_path"])
+    os.makedirs(p.parent, exist_ok=True)
+    with open(p, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def stage(name, inputs=None, **extra):
+    """
+    Context manager timing one pipeline stage. Yields a dict the caller may update
+    (e.g. record['outputs'] = df) before the block exits; the record is then written
+    as one JSON line to SETTINGS['log_path'].
+    When profiling is disabled it yields a throwaway dict and records nothing.
+    cProfile/tracemalloc capture is taken only by the outermost active stage.
+    peak_rss_mb is the peak resident memory while this stage ran (Linux only, else None);
+    process_peak_rss_mb is the lifetime high-water mark of the process.
+    """
+    global _DEPTH
+    if not SETTINGS["enabled"]:
+        yield {}
+        return
+
+    outermost = _DEPTH == 0
+    record = {"stage": name, "pid": os.getpid(), "depth": _DEPTH}
+    record.update(extra)
+    record["rows_in"], record["mem_in_mb"] = frame_stats(inputs)
+
+    profiler = cProfile.Profile() if SETTINGS["cprofile"] and outermost else None
+    trace = SETTINGS["tracemalloc"] and outermost
+    started_tracing = False
+    if trace and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+    if trace:
+        tracemalloc.reset_peak()
+
+    ctx = {}
+    rss0 = _current_rss_mb()
+    _enter_peak()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    _DEPTH += 1
+    if profiler is not None:
+        profiler.enable()
+    status = "ok"
+    try:
+        yield ctx
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _DEPTH -= 1
+        peak_rss = _exit_peak()
+        record["wall_s"] = round(time.perf_counter() - wall0, 6)
+        record["cpu_s"] = round(time.process_time() - cpu0, 6)
+        rss1 = _current_rss_mb()
+        record["rss_start_mb"] = rss0
+        record["rss_end_mb"] = rss1
+        record["rss_delta_mb"] = rss1 - rss0 if rss0 is not None and rss1 is not None else None
+        record["peak_rss_mb"] = peak_rss
+        record["process_peak_rss_mb"] = _process_peak_rss_mb()
+        record["rows_out"], record["mem_out_mb"] = frame_stats(ctx.get("outputs"))
+        record["status"] = status
+
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            record["tracemalloc_peak_mb"] = round(peak / (1024 * 1024), 3)
+            if started_tracing:
+                tracemalloc.stop()
+
+        if profiler is not None:
+            buf = io.StringIO()
+            stats = pstats.Stats(profiler, stream=buf).sort_stats("cumulative")
+            stats.print_stats(SETTINGS["top_n"])
+            record["cprofile"] = buf.getvalue()
+
+        record["ts"] = datetime.now(timezone.utc).isoformat()
+        write_record(record)
+
+
+def profile_stage(name=None):
+    """
+    Decorator form of `stage`. DataFrame positional/keyword arguments count as inputs and
+    the return value (DataFrame or tuple of DataFrames) counts as output.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not SETTINGS["enabled"]:
+                return func(*args, **kwargs)
+            inputs = list(args) + list(kwargs.values())
+            with stage(stage_name, inputs=inputs) as rec:
+                result = func(*args, **kwargs)
+                rec["outputs"] = result
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,247 @@
+# Batch scoring job: churn probability + CLV for every customer in one table.
+# Customers are hash-partitioned; each partition is scored in a worker process and
+# written to its own part file, so a failed run can be resumed from the missing parts.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from .config import PROCESSED_DIR, MODELS_DIR
+from .imputation import GroupedImputer
+from .models.predict import load_churn_model, load_bgf_ggf, load_churn_encodings
+from .models.train_churn import build_features, apply_codes
+from .models.train_clv import prepare_summary
+from .pipeline import file_hash
+from .profiling import profile_stage
+
+SCORES_PATH = PROCESSED_DIR / "customer_scores.parquet"
+
+# models loaded once per worker process by _init_worker
+_MODELS = {}
+
+
+def partition_customers(customer_ids, n_partitions):
+    """
+    Stable partition number per customer_id (hash of the id modulo n_partitions).
+    Returns a numpy array aligned with customer_ids.
+    """
+    ids = pd.Series(customer_ids).astype(str)
+    hashes = pd.util.hash_pandas_object(ids, index=False).values
+    return (hashes % np.uint64(n_partitions)).astype(int)
+
+
+def _init_worker(churn_path, bgf_path, ggf_path, encodings_path):
+    _MODELS['booster'] = load_churn_model(churn_path)
+    _MODELS['bgf'], _MODELS['ggf'] = load_bgf_ggf(bgf_path, ggf_path)
+    _MODELS['encodings'] = load_churn_encodings(encodings_path)
+
+
+def _churn_matrix(feat, booster, encodings):
+    """Shape build_features output like the training matrix in train_churn."""
+    X = feat.drop(columns=['customer_id', 'churn_next_30d'], errors='ignore')
+    X = apply_codes(X, encodings['codes'])
+    # dummies already use the training categories; reindex guards column order and
+    # any feature the booster has that this frame lacks
+    if booster.feature_names:
+        X = X.reindex(columns=booster.feature_names, fill_value=0)
+    return X.astype(float)
+
+
+@profile_stage()
+def score_partition(customers_df, orders_df, snapshot_date, horizon_months=12, discount_rate=0.01,
+                    booster=None, bgf=None, ggf=None, encodings=None):
+    """
+    Score one partition of customers. Returns a DataFrame with one row per customer:
+    churn_prob, RFM summary (frequency, recency, T, monetary_value), expected_purchases
+    over the horizon, clv and risk_weighted_clv = clv * (1 - churn_prob).
+    Models and the training encodings (train_churn return_encodings) default to the
+    ones loaded in the worker process.
+    """
+    if booster is None:
+        booster = _MODELS['booster']
+    if bgf is None:
+        bgf = _MODELS['bgf']
+    if ggf is None:
+        ggf = _MODELS.get('ggf')
+    if encodings is None:
+        encodings = _MODELS['encodings']
+
+    # ---- Churn: features from all orders up to the snapshot ----
+    feat = build_features(customers_df, orders_df, snapshot_date, categories=encodings['categories'])
+    X = _churn_matrix(feat, booster, encodings)
+    scores = pd.DataFrame({
+        'customer_id': feat['customer_id'].astype(str).values,
+        'churn_prob': booster.predict(xgb.DMatrix(X)),
+    })
+
+    # ---- CLV: RFM summary against the same observation end for every partition ----
+    orders = orders_df[pd.to_datetime(orders_df['order_date']) <= snapshot_date]
+    if len(orders):
+        summary = prepare_summary(orders, observation_period_end=snapshot_date + pd.Timedelta(days=1))
+        summary.index = summary.index.astype(str)
+        horizon_days = horizon_months * 30
+        summary['expected_purchases'] = bgf.conditional_expected_number_of_purchases_up_to_time(
+            horizon_days, summary['frequency'], summary['recency'], summary['T'])
+        if ggf is not None:
+            summary['clv'] = ggf.customer_lifetime_value(
+                bgf, summary['frequency'], summary['recency'], summary['T'], summary['monetary_value'],
+                time=horizon_months, discount_rate=discount_rate, freq='D')
+        else:
+            summary['clv'] = np.nan
+        scores = scores.merge(summary, left_on='customer_id', right_index=True, how='left')
+    else:
+        for col in ['frequency', 'recency', 'T', 'monetary_value', 'expected_purchases', 'clv']:
+            scores[col] = np.nan
+
+    # customers without orders: no expected purchases, no value
+    for col in ['frequency', 'recency', 'T', 'monetary_value', 'expected_purchases']:
+        scores[col] = scores[col].fillna(0)
+    if ggf is not None:
+        scores['clv'] = scores['clv'].fillna(0)
+
+    scores['risk_weighted_clv'] = scores['clv'] * (1 - scores['churn_prob'])
+    return scores
+
+
+def _part_path(parts_dir, part_id):
+    return Path(parts_dir) / f"part-{part_id:05d}.parquet"
+
+
+def _run_partition(part_id, customers_df, orders_df, snapshot_date, parts_dir, horizon_months, discount_rate):
+    scores = score_partition(customers_df, orders_df, snapshot_date,
+                             horizon_months=horizon_months, discount_rate=discount_rate)
+    scores['partition'] = part_id
+    # write then rename so a crash never leaves a half-written part behind
+    out = _part_path(parts_dir, part_id)
+    tmp = out.with_suffix(".tmp")
+    scores.to_parquet(tmp, index=False)
+    os.replace(tmp, out)
+    return part_id
+
+
+def frame_hash(df):
+    """sha256 over the row hashes of a DataFrame (content, column names and row order)."""
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _prepare_parts_dir(parts_dir, meta, resume):
+    """
+    Keep existing part files only when resuming a run with identical settings.
+    """
+    parts_dir = Path(parts_dir)
+    meta_path = parts_dir / "_meta.json"
+    if resume and meta_path.exists():
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return
+        print("[score] settings changed since the previous run; discarding old partitions")
+    if parts_dir.exists():
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def run_batch_scoring(customers_df, orders_df, output_path=SCORES_PATH, n_partitions=8, max_workers=None,
+                      horizon_months=12, discount_rate=0.01, resume=True,
+                      churn_path=None, bgf_path=None, ggf_path=None, encodings_path=None, imputer=None):
+    """
+    Score all customers in n_partitions partitions using a process pool and write
+    a single customer_scores Parquet to output_path.
+    Part files are kept in '<output_path stem>_parts/' until every partition succeeds; with
+    resume=True a re-run only scores the partitions that are missing.
+    imputer: optional fitted GroupedImputer applied to customers_df before scoring.
+    """
+    output_path = Path(output_path)
+    parts_dir = output_path.parent / f"{output_path.stem}_parts"
+
+    customers_df = imputer.transform(customers_df) if imputer is not None else customers_df.copy()
+    orders_df = orders_df.copy()
+    customers_df['customer_id'] = customers_df['customer_id'].astype(str)
+    orders_df['customer_id'] = orders_df['customer_id'].astype(str)
+    orders_df['order_date'] = pd.to_datetime(orders_df['order_date'])
+    snapshot_date = orders_df['order_date'].max()
+
+    # resolve the same defaults predict.py uses so the fingerprints cover the files actually loaded
+    model_paths = {
+        "churn_model": Path(churn_path) if churn_path else Path(MODELS_DIR) / "churn_model.pkl",
+        "bgf": Path(bgf_path) if bgf_path else Path(MODELS_DIR) / "bgf.pkl",
+        "ggf": Path(ggf_path) if ggf_path else Path(MODELS_DIR) / "ggf.pkl",
+        "churn_encodings": Path(encodings_path) if encodings_path else Path(MODELS_DIR) / "churn_encodings.pkl",
+    }
+    # part files are only reused when models and input data are byte-for-byte the same
+    meta = {
+        "n_partitions": n_partitions,
+        "snapshot_date": str(snapshot_date),
+        "horizon_months": horizon_months,
+        "discount_rate": discount_rate,
+        "models": {k: file_hash(p, {}) for k, p in model_paths.items()},
+        "customers": frame_hash(customers_df),
+        "orders": frame_hash(orders_df),
+    }
+    _prepare_parts_dir(parts_dir, meta, resume)
+
+    cust_part = partition_customers(customers_df['customer_id'], n_partitions)
+    ord_part = partition_customers(orders_df['customer_id'], n_partitions)
+    todo = [p for p in range(n_partitions) if not _part_path(parts_dir, p).exists()]
+    if len(todo) < n_partitions:
+        print(f"[score] resuming: {n_partitions - len(todo)} of {n_partitions} partitions already scored")
+
+    failed = {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(model_paths["churn_model"], model_paths["bgf"], model_paths["ggf"],
+                                       model_paths["churn_encodings"])) as pool:
+        futures = {
+            pool.submit(_run_partition, p, customers_df[cust_part == p], orders_df[ord_part == p],
+                        snapshot_date, parts_dir, horizon_months, discount_rate): p
+            for p in todo
+        }
+        for fut in as_completed(futures):
+            p = futures[fut]
+            try:
+                fut.result()
+            except Exception as e:
+                failed[p] = repr(e)
+                print(f"[score] partition {p} failed: {e}")
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} partition(s) failed, re-run to resume: {failed}")
+
+    scores = pd.concat(
+        [pd.read_parquet(_part_path(parts_dir, p)) for p in range(n_partitions)],
+        ignore_index=True,
+    )
+    os.makedirs(output_path.parent, exist_ok=True)
+    scores.to_parquet(output_path, index=False)
+    shutil.rmtree(parts_dir)
+    print(f"[score] wrote {len(scores)} customer scores to {output_path}")
+    return scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch churn + CLV scoring.")
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--horizon-months", type=int, default=12)
+    parser.add_argument("--discount-rate", type=float, default=0.01)
+    parser.add_argument("--no-resume", action="store_true")
+    parser.add_argument("--output", default=str(SCORES_PATH))
+    parser.add_argument("--imputer", default=None, help="fitted GroupedImputer pickle, e.g. data/customer_imputer.pkl")
+    args = parser.parse_args()
+
+    customers = pd.read_parquet(PROCESSED_DIR / "customers_clean.parquet")
+    orders = pd.read_parquet(PROCESSED_DIR / "orders_clean.parquet")
+    run_batch_scoring(customers, orders, output_path=args.output, n_partitions=args.partitions,
+                      max_workers=args.workers, horizon_months=args.horizon_months,
+                      discount_rate=args.discount_rate, resume=not args.no_resume,
+                      imputer=GroupedImputer.load(args.imputer) if args.imputer else None)
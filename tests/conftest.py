@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# dependency-free modules (imputation, profiling) are imported directly; package-relative
+# modules (pipeline, score) are imported as src.* and need the src/ + config layout
+sys.path.insert(0, str(ROOT))
+if (ROOT / "src").is_dir():
+    sys.path.insert(0, str(ROOT / "src"))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from imputation import GroupedImputer
+
+
+def make_df():
+    return pd.DataFrame({
+        'cohort': ['a', 'a', 'b', 'b', None, 'c'],
+        'x': [1.0, np.nan, 3.0, np.nan, 5.0, np.nan],
+        'r': [np.nan] * 6,
+        't': ['p', 'p', None, 'q', 'q', None],
+    })
+
+
+def test_global_fill_matches_median_and_mode():
+    df = make_df()
+    out = GroupedImputer(['x'], ['t']).fit_transform(df)
+    assert out['x'].tolist() == [1.0, 3.0, 3.0, 3.0, 5.0, 3.0]
+    # 'p' and 'q' tie; like mode()[0] the smallest value wins
+    assert out['t'].tolist() == ['p', 'p', 'p', 'q', 'q', 'p']
+
+
+def test_mode_tie_breaks_like_pandas_mode():
+    s = pd.Series(['b', 'a', 'b', 'a', None])
+    imp = GroupedImputer(mode_cols=['v']).fit(pd.DataFrame({'v': s}))
+    assert imp.global_modes_['v'] == s.mode()[0] == 'a'
+
+
+def test_grouped_fill_falls_back_to_global():
+    df = make_df()
+    out = GroupedImputer(['x'], ['t'], group_cols=['cohort']).fit_transform(df)
+    # rows 1 and 3 use their group's statistics; cohort 'c' is unseen so uses the global ones
+    assert out['x'].tolist() == [1.0, 1.0, 3.0, 3.0, 5.0, 3.0]
+    assert out['t'].tolist() == ['p', 'p', 'q', 'q', 'q', 'p']
+
+
+def test_grouped_all_nan_mode_column():
+    df = make_df()
+    out = GroupedImputer(['x'], ['r', 't'], group_cols=['cohort']).fit_transform(df)
+    assert out['r'].isna().all()
+    assert out['t'].notna().all()
+
+
+def test_save_load_round_trip(tmp_path):
+    df = make_df()
+    imp = GroupedImputer(['x'], ['r', 't'], group_cols=['cohort']).fit(df)
+    path = tmp_path / "imputer.pkl"
+    imp.save(path)
+    loaded = GroupedImputer.load(path)
+
+    new = pd.DataFrame({'cohort': ['b', 'z'], 'x': [np.nan, np.nan], 'r': [np.nan, np.nan], 't': [None, None]})
+    pd.testing.assert_frame_equal(loaded.transform(new), imp.transform(new))
+    assert loaded.transform(new)['x'].tolist() == [3.0, 3.0]
@@ -0,0 +1,88 @@
+import json
+import types
+
+import pytest
+
+pytest.importorskip("src.config")
+from src import pipeline
+
+
+def stub(inputs, outputs, params):
+    """Deterministic stand-in for a stage: outputs depend only on inputs and params."""
+    payload = {k: open(p).read() for k, p in sorted(inputs.items())}
+    for name, path in outputs.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"out": name, "inputs": payload, "params": params}, sort_keys=True))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "CACHE_DIR", tmp_path / ".pipeline_cache")
+    monkeypatch.setattr(pipeline, "DATA_DIR", tmp_path / "data")
+    monkeypatch.setattr(pipeline, "PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr(pipeline, "MODELS_DIR", tmp_path / "models")
+    (tmp_path / "data").mkdir()
+    for name in ["customers_dim", "orders_fact", "order_items", "products_dim",
+                 "customer_interactions", "marketing_spend", "returns_refunds"]:
+        (tmp_path / "data" / f"{name}.csv").write_text(f"{name}\n1\n")
+    return tmp_path
+
+
+def stages(**params):
+    return {name: s._replace(func=stub) for name, s in pipeline.build_stages(**params).items()}
+
+
+def run(**params):
+    return pipeline.run_pipeline(stages(**params), max_workers=2)
+
+
+ALL = ["merge", "preprocess", "train_churn", "train_clv"]
+
+
+def test_second_run_is_fully_cached(workdir):
+    assert run() == {name: "ran" for name in ALL}
+    assert run() == {name: "cached" for name in ALL}
+
+
+def test_clv_parameter_change_only_reruns_clv(workdir):
+    run()
+    result = run(penalizer_coef=0.5)
+    assert result == {"merge": "cached", "preprocess": "cached", "train_churn": "cached", "train_clv": "ran"}
+
+
+def test_input_change_invalidates_downstream(workdir):
+    run()
+    (workdir / "data" / "orders_fact.csv").write_text("orders_fact\n2\n")
+    assert run() == {name: "ran" for name in ALL}
+
+
+def test_code_change_invalidates_stage(workdir):
+    module = workdir / "fake_module.py"
+    module.write_text("x = 1\n")
+
+    def with_code(**params):
+        st = stages(**params)
+        st["train_churn"] = st["train_churn"]._replace(code=[types.SimpleNamespace(__file__=str(module))])
+        return st
+
+    pipeline.run_pipeline(with_code())
+    module.write_text("x = 2\n")
+    result = pipeline.run_pipeline(with_code())
+    assert result["train_churn"] == "ran"
+    assert result["train_clv"] == "cached"
+
+
+def test_tampered_output_reruns_stage(workdir):
+    run()
+    (workdir / "models" / "bgf.pkl").write_text("tampered")
+    result = run()
+    assert result["train_clv"] == "ran"
+    assert result["train_churn"] == "cached"
+
+
+def test_missing_input_fails_stage_and_skips_dependents(workdir):
+    (workdir / "data" / "returns_refunds.csv").unlink()
+    result = run()
+    assert result == {"merge": "failed", "preprocess": "skipped", "train_churn": "skipped", "train_clv": "skipped"}
+    assert (workdir / ".pipeline_cache" / "file_hashes.json").exists()
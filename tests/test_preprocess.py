@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("src.config")
+from src.data_merge import CUSTOMER_NUMERIC_COLS, pre_cutoff_tables
+from src.imputation import GroupedImputer
+from src.preprocess import clean_customers
+
+
+def test_clean_customers_zero_fills_what_the_imputer_leaves():
+    fit = pd.DataFrame({'customer_id': ['1', '2'], 'num_orders': [1.0, 3.0], 'total_returns': [np.nan, np.nan]})
+    imputer = GroupedImputer(numeric_cols=CUSTOMER_NUMERIC_COLS).fit(fit)
+
+    new = pd.DataFrame({
+        'customer_id': ['3'],
+        'num_orders': [np.nan],
+        'total_returns': [np.nan],  # all-NaN at fit time: no median
+        'total_clicks': [np.nan],   # absent at fit time
+    })
+    out = clean_customers(new, imputer=imputer)
+    assert out.loc[0, 'num_orders'] == 2.0
+    assert out.loc[0, 'total_returns'] == 0
+    assert out.loc[0, 'total_clicks'] == 0
+
+
+def test_pre_cutoff_tables_drops_label_window():
+    orders = pd.DataFrame({
+        'order_id': [1, 2, 3],
+        'order_date': ['2024-01-01', '2024-02-15', '2024-03-30'],
+    })
+    items = pd.DataFrame({'order_item_id': [10, 11, 12], 'order_id': [1, 2, 3]})
+    returns = pd.DataFrame({'return_id': [20, 21], 'order_id': [1, 3]})
+
+    kept, kept_items, kept_returns = pre_cutoff_tables(orders, items, returns, label_days=30)
+    assert kept['order_id'].tolist() == [1, 2]
+    assert kept_items['order_id'].tolist() == [1, 2]
+    assert kept_returns['order_id'].tolist() == [1]
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def log(tmp_path):
+    saved = dict(profiling.SETTINGS)
+    path = tmp_path / "profile.jsonl"
+    profiling.configure(enabled=True, log_path=str(path), cprofile=True, tracemalloc=True, top_n=500)
+    yield path
+    profiling.SETTINGS.update(saved)
+
+
+def read(path):
+    with open(path) as f:
+        return {r["stage"]: r for r in map(json.loads, f)}
+
+
+def test_nested_stages_share_one_profiler(log):
+    @profiling.profile_stage()
+    def inner():
+        return [0] * 1000
+
+    with profiling.stage("outer"):
+        inner()
+
+    records = read(log)
+    assert records["inner"]["depth"] == 1
+    assert "cprofile" not in records["inner"]
+    assert "inner" in records["outer"]["cprofile"]
+    assert records["outer"]["tracemalloc_peak_mb"] is not None
+
+
+def test_peak_rss_is_per_stage(log):
+    if profiling._read_hwm_mb() is None or not profiling._reset_hwm():
+        pytest.skip("VmHWM reset needs Linux /proc")
+
+    with profiling.stage("outer"):
+        with profiling.stage("big"):
+            a = np.ones(100_000_000 // 8)
+            a[:] = 1
+            del a
+        with profiling.stage("small"):
+            pass
+
+    records = read(log)
+    # the ~100MB transient shows up in 'big' and its parent but not in the later sibling
+    assert records["big"]["peak_rss_mb"] - records["small"]["peak_rss_mb"] > 50
+    assert records["outer"]["peak_rss_mb"] >= records["big"]["peak_rss_mb"]
+    assert records["small"]["process_peak_rss_mb"] >= records["big"]["peak_rss_mb"]
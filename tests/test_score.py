@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("src.config")
+pytest.importorskip("xgboost")
+pytest.importorskip("lifetimes")
+from src.models.train_churn import train_churn
+from src.models.train_clv import train_bgfgg
+from src.pipeline import _save_pickle, _save_fitter
+from src.score import run_batch_scoring
+
+
+def make_data(n=240, seed=0):
+    """
+    Customers whose churn depends only on cohort: B customers order again inside the label
+    window, C customers do not. A single customer is in cohort A, the baseline dummy level,
+    so most partitions do not contain it.
+    """
+    rng = np.random.default_rng(seed)
+    cohort = np.where(np.arange(n) == 0, 'A', np.where(np.arange(n) % 2, 'B', 'C'))
+    customers = pd.DataFrame({
+        'customer_id': [str(i) for i in range(n)],
+        'cohort': cohort,
+        'gender': rng.choice(['F', 'M'], n),
+        'region': rng.choice(['north', 'south'], n),
+    })
+    start = pd.Timestamp('2023-01-01')
+    rows = []
+    for i in range(n):
+        days = list(rng.integers(0, 300, 3))
+        if cohort[i] == 'B':
+            days.append(int(rng.integers(340, 365)))
+        for d in days:
+            rows.append({'order_id': str(len(rows)), 'customer_id': str(i),
+                         'order_date': start + pd.Timedelta(days=int(d)),
+                         'order_amount': float(rng.gamma(2, 30)), 'num_returns': 0, 'total_quantity': 1})
+    return customers, pd.DataFrame(rows)
+
+
+@pytest.fixture
+def models(tmp_path):
+    customers, orders = make_data()
+    bst, encodings = train_churn(customers, orders, return_encodings=True)
+    bgf, ggf = train_bgfgg(orders)
+    paths = {
+        'churn_path': tmp_path / 'churn_model.pkl',
+        'encodings_path': tmp_path / 'churn_encodings.pkl',
+        'bgf_path': tmp_path / 'bgf.pkl',
+        'ggf_path': tmp_path / 'ggf.pkl',
+    }
+    _save_pickle(bst, paths['churn_path'])
+    _save_pickle(encodings, paths['encodings_path'])
+    _save_fitter(bgf, paths['bgf_path'])
+    _save_fitter(ggf, paths['ggf_path'])
+    return customers, orders, paths
+
+
+def test_scores_do_not_depend_on_partitioning(models, tmp_path):
+    customers, orders, paths = models
+    one = run_batch_scoring(customers, orders, output_path=tmp_path / 'one.parquet',
+                            n_partitions=1, max_workers=1, **paths)
+    many = run_batch_scoring(customers, orders, output_path=tmp_path / 'many.parquet',
+                             n_partitions=4, max_workers=2, **paths)
+
+    one = one.sort_values('customer_id').reset_index(drop=True)
+    many = many.sort_values('customer_id').reset_index(drop=True)
+    assert len(one) == len(customers)
+    np.testing.assert_array_equal(one['churn_prob'].values, many['churn_prob'].values)
+    np.testing.assert_allclose(one['clv'].values, many['clv'].values)
+
+    # the model does use cohort, so a wrong dummy baseline would have shown up above
+    by_cohort = one.merge(customers, on='customer_id').groupby('cohort')['churn_prob'].mean()
+    assert by_cohort['B'] < by_cohort['C']
@@ -7,9 +7,11 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, classification_report, confusion_matrix
 import warnings
+from ..profiling import profile_stage
 
 warnings.filterwarnings("ignore")
 
+@profile_stage()
 def make_label(orders, label_days=30):
     """
     Create churn label using a time-based holdout:
@@ -39,10 +41,41 @@ def make_label(orders, label_days=30):
     label_df = pd.DataFrame(rows)
     return label_df, cutoff_date, snapshot_date
 
-def build_features(customers_df, orders_df, cutoff_date):
+# columns one-hot encoded by build_features
+CATEGORICAL_COLS = ['gender', 'cohort', 'acquisition_channel', 'loyalty_status']
+
+def fit_categories(customers_df):
+    """
+    Sorted category list per one-hot column. Passing these to build_features makes the
+    dummy columns (and the dropped baseline level) the same for any subset of customers.
+    """
+    return {
+        c: sorted(customers_df[c].dropna().unique().tolist())
+        for c in CATEGORICAL_COLS if c in customers_df.columns
+    }
+
+def fit_codes(X_train):
+    """value -> integer code for the object columns of the training matrix (LabelEncoder order)."""
+    codes = {}
+    for col in X_train.select_dtypes(include='object').columns:
+        le = LabelEncoder().fit(X_train[col].astype(str))
+        codes[col] = {str(v): i for i, v in enumerate(le.classes_)}
+    return codes
+
+def apply_codes(X, codes):
+    """Encode object columns with training codes; values unseen in training become -1."""
+    X = X.copy()
+    for col in X.select_dtypes(include='object').columns:
+        X[col] = X[col].astype(str).map(codes.get(col, {})).fillna(-1).astype(int)
+    return X
+
+@profile_stage()
+def build_features(customers_df, orders_df, cutoff_date, categories=None):
     """
     Create features using only orders up to cutoff_date (to avoid label leakage).
     Uses customer_summary fields and order-aggregations.
+    categories: optional output of fit_categories; without it the dummy columns depend on
+    which values are present in customers_df.
     """
     customers_df = customers_df.copy()
     orders_df = orders_df.copy()
@@ -78,10 +111,14 @@ def build_features(customers_df, orders_df, cutoff_date):
 
     # encode simple categorical columns with get_dummies (small)
     cat_cols = []
-    for candidate in ['gender','cohort','acquisition_channel','loyalty_status']:
+    for candidate in CATEGORICAL_COLS:
         if candidate in feat.columns:
             cat_cols.append(candidate)
     if cat_cols:
+        if categories is not None:
+            for c in cat_cols:
+                if c in categories:
+                    feat[c] = pd.Categorical(feat[c], categories=categories[c])
         feat = pd.get_dummies(feat, columns=cat_cols, drop_first=True)
 
     # drop columns that are identifiers or text long fields
@@ -95,16 +132,19 @@ def build_features(customers_df, orders_df, cutoff_date):
 
     return feat
 
-def train_churn(customers_df, orders_df, label_days=30, return_eval=False):
+def train_churn(customers_df, orders_df, label_days=30, return_eval=False, return_encodings=False):
     """
     Trains an XGBoost churn classifier. Does NOT save the model to disk by default.
     If return_eval True: returns (model, X_val, y_val, metrics_dict)
+    If return_encodings True: the encodings dict {'categories': ..., 'codes': ...} needed to
+    rebuild the feature matrix at scoring time is appended to the return value.
     """
     # create label
     labels_df, cutoff_date, snapshot_date = make_label(orders_df, label_days=label_days)
 
     # build features using data up to cutoff_date
-    feat = build_features(customers_df, orders_df, cutoff_date)
+    categories = fit_categories(customers_df)
+    feat = build_features(customers_df, orders_df, cutoff_date, categories=categories)
 
     # join label
     data = feat.merge(labels_df, on='customer_id', how='left')
@@ -118,13 +158,11 @@ def train_churn(customers_df, orders_df, label_days=30, return_eval=False):
     # split
     X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-    # xgboost DMatrix
-    for col in X_train.select_dtypes(include='object').columns:
-        le = LabelEncoder()
-        X_train[col] = le.fit_transform(X_train[col].astype(str))
-    for col in X_val.select_dtypes(include='object').columns:
-        le = LabelEncoder()
-        X_val[col] = le.fit_transform(X_val[col].astype(str))
+    # xgboost DMatrix; object columns use codes fitted on the training split only
+    codes = fit_codes(X_train)
+    X_train = apply_codes(X_train, codes)
+    X_val = apply_codes(X_val, codes)
+    encodings = {'categories': categories, 'codes': codes}
 
     dtrain = xgb.DMatrix(X_train, label=y_train, enable_categorical=True)
     dval = xgb.DMatrix(X_val, label=y_val, enable_categorical=True)
@@ -159,9 +197,12 @@ def train_churn(customers_df, orders_df, label_days=30, return_eval=False):
 
     if return_eval:
         # return model and some evaluation objects for app use
-        return bst, X_val, y_val, metrics
+        result = (bst, X_val, y_val, metrics)
     else:
-        return bst
+        result = (bst,)
+    if return_encodings:
+        result += (encodings,)
+    return result if len(result) > 1 else bst
 
 # If run as script
 if __name__ == "__main__":
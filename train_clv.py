@@ -3,22 +3,27 @@ from lifetimes.utils import summary_data_from_transaction_data
 import pandas as pd
 import pickle
 import warnings
+from ..profiling import profile_stage
 
 warnings.filterwarnings("ignore")
 
-def prepare_summary(orders_df, monetary_value_col='order_amount'):
+def prepare_summary(orders_df, monetary_value_col='order_amount', observation_period_end=None):
     """
     Create the lifetimes summary table with columns:
     - frequency: number of repeat purchases (frequency)
     - recency: recency (in same units as T)
     - T: customer age (observation period length)
     - monetary_value: average order value per customer
+    observation_period_end defaults to the day after the last order; pass it explicitly
+    when summarising a subset of customers so T is measured against the same date.
     Returns the summary DataFrame.
     """
     orders = orders_df.copy()
     orders['order_date'] = pd.to_datetime(orders['order_date'])
 
-    snapshot_date = orders['order_date'].max() + pd.Timedelta(days=1)
+    snapshot_date = observation_period_end
+    if snapshot_date is None:
+        snapshot_date = orders['order_date'].max() + pd.Timedelta(days=1)
 
     summary = summary_data_from_transaction_data(
         transactions=orders,
@@ -31,9 +36,12 @@ def prepare_summary(orders_df, monetary_value_col='order_amount'):
     # summary has columns frequency, recency, T, monetary_value
     return summary
 
-def train_bgfgg(orders_df, monetary_value_col='order_amount', return_summary=False):
+@profile_stage()
+def train_bgfgg(orders_df, monetary_value_col='order_amount', return_summary=False,
+                penalizer_coef=1.0, gg_penalizer_coef=0.01):
     """
     Fit BetaGeoFitter and GammaGammaFitter on the provided orders DataFrame.
+    penalizer_coef / gg_penalizer_coef are the L2 penalties for BG/NBD and Gamma-Gamma.
     Returns bgf, ggf and optionally the summary used for fitting.
     """
     summary = prepare_summary(orders_df, monetary_value_col=monetary_value_col)
@@ -43,10 +51,10 @@ def train_bgfgg(orders_df, monetary_value_col='order_amount', return_summary=Fal
     # Optional: cap extreme monetary values to reduce variance
     summary['monetary_value'] = summary['monetary_value'].clip(upper=summary['monetary_value'].quantile(0.99))
 
-    bgf = BetaGeoFitter(penalizer_coef=1.0)
-    bgf.fit(summary['frequency'], summary['recency'], summary['T'], penalizer_coef=1)
+    bgf = BetaGeoFitter(penalizer_coef=penalizer_coef)
+    bgf.fit(summary['frequency'], summary['recency'], summary['T'], penalizer_coef=penalizer_coef)
     
-    ggf = GammaGammaFitter(penalizer_coef=0.01)
+    ggf = GammaGammaFitter(penalizer_coef=gg_penalizer_coef)
     try:
         ggf.fit(summary['frequency'], summary['monetary_value'])
     except Exception as e: